@@ -1,34 +1,101 @@
-from flask import Flask, request, jsonify
-from flask_cors import CORS
+from quart import Quart, request, jsonify
+from quart.json.provider import DefaultJSONProvider
+from quart_cors import cors
+import orjson
 import os
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
 import numpy as np
 from dotenv import load_dotenv
-from emotion_classifier import EmotionClassifier
+from emotion_classifier import EMOTIONS, EmotionClassifier
 from music_recommender import MusicRecommender
+from voice_batcher import VoiceBatcher
 
 # Load environment variables
 load_dotenv()
 
-app = Flask(__name__)
-CORS(app)
+class OrjsonProvider(DefaultJSONProvider):
+    """JSON provider backed by orjson, with native NumPy serialization"""
+    
+    def _dumps_bytes(self, obj):
+        return orjson.dumps(
+            obj,
+            default=self.default,
+            option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+        )
+    
+    def dumps(self, obj, **kwargs):
+        return self._dumps_bytes(obj).decode()
+    
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+    
+    def response(self, *args, **kwargs):
+        """Build jsonify() responses from orjson's bytes without a str round trip"""
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(self._dumps_bytes(obj), mimetype='application/json')
+
+app = Quart(__name__)
+app.json = OrjsonProvider(app)
+app = cors(app, allow_origin='*')
+
+# Emotions accepted as-is from the detectors
+_VALID_EMOTIONS = frozenset(EMOTIONS)
 
 # Initialize classifiers
 emotion_classifier = EmotionClassifier()
 music_recommender = MusicRecommender()
 
+# Process pool for CPU-bound voice analysis, created per serving process.
+# All serving processes share one CPU budget, so by default each gets its share
+# of the cores (WEB_CONCURRENCY is exported by gunicorn.conf.py).
+voice_pool = None
+
+def _analyze_voice_batch_worker(payloads):
+    """
+    Process pool entry point; decodes and classifies a micro-batch of uploads
+    With fork (Linux) the worker reuses the parent's warmed-up classifier; with
+    spawn (macOS/Windows) it re-imports this module and builds its own
+    """
+    return emotion_classifier.analyze_voice_payloads(payloads)
+
+async def _analyze_voice_batch(payloads):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(voice_pool, _analyze_voice_batch_worker, payloads)
+
+# Concurrent uploads are analyzed together to share one batched FFT; raw bytes
+# go to the pool once, so decoded clips never travel back through the parent
+voice_batcher = VoiceBatcher(_analyze_voice_batch)
+
+@app.before_serving
+async def startup():
+    """Start the voice analysis process pool and batcher"""
+    global voice_pool
+    web_workers = int(os.environ.get('WEB_CONCURRENCY', 1))
+    default_workers = max(1, (os.cpu_count() or 1) // web_workers)
+    max_workers = int(os.environ.get('VOICE_WORKERS', default_workers))
+    voice_pool = ProcessPoolExecutor(max_workers=max_workers)
+    voice_batcher.start()
+
+@app.after_serving
+async def shutdown():
+    """Close pooled Spotify connections and voice workers"""
+    await music_recommender.aclose()
+    await voice_batcher.stop()
+    voice_pool.shutdown()
+
 @app.route('/api/process-emotion', methods=['POST'])
-def process_emotion():
+async def process_emotion():
     """Process emotion from face or voice detection"""
     try:
-        data = request.json
+        data = await request.get_json()
         emotion = data.get('emotion')
         source = data.get('source', 'face')
         
         # Validate and normalize emotion
-        valid_emotions = ['happy', 'sad', 'energetic', 'calm', 'stressed', 'neutral']
         emotion = emotion.lower() if emotion else 'neutral'
         
-        if emotion not in valid_emotions:
+        if emotion not in _VALID_EMOTIONS:
             # Use ML model to classify if emotion is not valid
             emotion = emotion_classifier.classify(emotion)
         
@@ -41,24 +108,17 @@ def process_emotion():
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/analyze-voice', methods=['POST'])
-def analyze_voice():
+async def analyze_voice():
     """Analyze voice emotion from audio file"""
     try:
-        if 'audio' not in request.files:
+        files = await request.files
+        if 'audio' not in files:
             return jsonify({'error': 'No audio file provided'}), 400
         
-        audio_file = request.files['audio']
-        
-        # Save temporary file
-        temp_path = 'temp_audio.wav'
-        audio_file.save(temp_path)
+        audio_file = files['audio']
         
-        # Analyze voice emotion
-        emotion = emotion_classifier.analyze_voice(temp_path)
-        
-        # Clean up
-        if os.path.exists(temp_path):
-            os.remove(temp_path)
+        # Decode and analyze in worker processes so DSP never blocks the event loop
+        emotion = await voice_batcher.submit(audio_file.read())
         
         return jsonify({
             'emotion': emotion,
@@ -68,13 +128,13 @@ def analyze_voice():
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/recommend-music', methods=['POST'])
-def recommend_music():
+async def recommend_music():
     """Get music recommendations based on emotion"""
     try:
-        data = request.json
+        data = await request.get_json()
         emotion = data.get('emotion', 'neutral')
         
-        recommendations = music_recommender.get_recommendations(emotion)
+        recommendations = await music_recommender.get_recommendations(emotion)
         
         return jsonify({
             'emotion': emotion,
@@ -84,12 +144,12 @@ def recommend_music():
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/health', methods=['GET'])
-def health():
+async def health():
     """Health check endpoint"""
     return jsonify({'status': 'healthy', 'service': 'emotion-aware-music-recommender'})
 
 @app.route('/', methods=['GET'])
-def root():
+async def root():
     """Root endpoint - API information"""
     return jsonify({
         'message': 'Emotion-Aware Music Recommender API',
@@ -104,7 +164,7 @@ def root():
     })
 
 @app.errorhandler(404)
-def not_found(error):
+async def not_found(error):
     """Handle 404 errors"""
     return jsonify({
         'error': 'Endpoint not found',
@@ -117,7 +177,3 @@ def not_found(error):
         ]
     }), 404
 
-if __name__ == '__main__':
-    port = int(os.environ.get('PORT', 5000))
-    app.run(host='0.0.0.0', port=port, debug=True)
-
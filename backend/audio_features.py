@@ -0,0 +1,155 @@
+"""
+NumPy audio feature extraction for voice emotion analysis
+"""
+from functools import lru_cache
+import numpy as np
+
+# The spectral centroid thresholds in the emotion rules assume the full 0-11 kHz
+# band, so clips are analyzed at librosa's default rate rather than downsampled
+SAMPLE_RATE = 22050
+N_FFT = 2048
+HOP_LENGTH = 512
+N_MELS = 40
+N_MFCC = 13
+ROLL_PERCENT = 0.85
+
+# Column layout of the feature vector returned by extract_features
+ZCR, SPECTRAL_CENTROID, SPECTRAL_ROLLOFF, ENERGY, TEMPO, *MFCC = range(5 + N_MFCC)
+N_FEATURES = 5 + N_MFCC
+
+
+def _hz_to_mel(hz):
+    return 2595.0 * np.log10(1.0 + hz / 700.0)
+
+
+def _mel_to_hz(mel):
+    return 700.0 * (10.0 ** (mel / 2595.0) - 1.0)
+
+
+@lru_cache(maxsize=None)
+def hann_window(n_fft: int) -> np.ndarray:
+    """Periodic Hann window of length n_fft"""
+    return np.hanning(n_fft + 1)[:-1].astype(np.float32)
+
+
+@lru_cache(maxsize=None)
+def mel_filterbank(sr: int, n_fft: int, n_mels: int) -> np.ndarray:
+    """Triangular mel filterbank of shape (n_fft // 2 + 1, n_mels)"""
+    fft_freqs = np.fft.rfftfreq(n_fft, 1.0 / sr)
+    hz_points = _mel_to_hz(np.linspace(0.0, _hz_to_mel(sr / 2.0), n_mels + 2))
+    lower, center, upper = hz_points[:-2, None], hz_points[1:-1, None], hz_points[2:, None]
+    rising = (fft_freqs - lower) / (center - lower)
+    falling = (upper - fft_freqs) / (upper - center)
+    filters = np.maximum(0.0, np.minimum(rising, falling))
+    return np.ascontiguousarray(filters.T, dtype=np.float32)
+
+
+@lru_cache(maxsize=None)
+def dct_matrix(n_mels: int, n_mfcc: int) -> np.ndarray:
+    """Orthonormal DCT-II basis of shape (n_mels, n_mfcc)"""
+    n = np.arange(n_mels)
+    k = np.arange(n_mfcc)[:, None]
+    basis = np.cos(np.pi / n_mels * (n + 0.5) * k) * np.sqrt(2.0 / n_mels)
+    basis[0] /= np.sqrt(2.0)
+    return np.ascontiguousarray(basis.T, dtype=np.float32)
+
+
+def power_spectrogram(clips: np.ndarray, n_fft: int = N_FFT, hop_length: int = HOP_LENGTH) -> np.ndarray:
+    """
+    Power spectrum of Hann-windowed frames along the last axis
+    Shape (..., n_frames, n_fft // 2 + 1); a (B, N) batch is transformed in one rfft call
+    """
+    if clips.shape[-1] < n_fft:
+        pad = [(0, 0)] * (clips.ndim - 1) + [(0, n_fft - clips.shape[-1])]
+        clips = np.pad(clips, pad)
+    frames = np.lib.stride_tricks.sliding_window_view(clips, n_fft, axis=-1)[..., ::hop_length, :]
+    spectrum = np.fft.rfft(frames * hann_window(n_fft), axis=-1)
+    return (spectrum.real**2 + spectrum.imag**2).astype(np.float32)
+
+
+def num_frames(length: int, n_fft: int = N_FFT, hop_length: int = HOP_LENGTH) -> int:
+    """Number of frames power_spectrogram yields for a clip of the given length"""
+    return 1 + (max(length, n_fft) - n_fft) // hop_length
+
+
+def estimate_tempo(onset_env: np.ndarray, frame_rate: float, default: float = 120.0) -> float:
+    """
+    Estimate tempo (BPM) from the autocorrelation of an onset envelope
+    Candidate tempos are weighted by a log-normal prior centred on 120 BPM
+    """
+    n = len(onset_env)
+    if n < 4 or not np.any(onset_env):
+        return default
+
+    env = onset_env - onset_env.mean()
+    spectrum = np.fft.rfft(env, 2 * n)
+    autocorr = np.fft.irfft(spectrum.real**2 + spectrum.imag**2)[:n]
+
+    lags = np.arange(1, n)
+    bpms = 60.0 * frame_rate / lags
+    prior = np.exp(-0.5 * (np.log2(bpms) - np.log2(default))**2)
+    valid = (bpms >= 30.0) & (bpms <= 300.0)
+    if not np.any(valid):
+        return default
+
+    scores = np.where(valid, autocorr[1:] * prior, -np.inf)
+    return float(bpms[np.argmax(scores)])
+
+
+def _features_from_spectrum(y: np.ndarray, power: np.ndarray, mel: np.ndarray, sr: int, out: np.ndarray):
+    """Aggregate one clip's power and mel spectrograms into the feature vector out"""
+    magnitude = np.sqrt(power)
+    freqs = np.fft.rfftfreq(N_FFT, 1.0 / sr).astype(np.float32)
+
+    # Zero crossing rate (indicates energy), in crossings per second so it doesn't depend on sr
+    out[ZCR] = np.mean(np.diff(np.signbit(y))) * sr if y.size > 1 else 0.0
+
+    # Spectral centroid (brightness)
+    total = magnitude.sum(axis=-1)
+    centroid = (magnitude @ freqs) / np.maximum(total, 1e-10)
+    out[SPECTRAL_CENTROID] = np.mean(centroid)
+
+    # Spectral rolloff
+    cumulative = np.cumsum(magnitude, axis=-1)
+    rolloff_bins = np.argmax(cumulative >= ROLL_PERCENT * cumulative[:, -1:], axis=-1)
+    out[SPECTRAL_ROLLOFF] = np.mean(freqs[rolloff_bins])
+
+    # MFCC features (mel-frequency cepstral coefficients)
+    log_mel = 10.0 * np.log10(np.maximum(mel, 1e-10))
+    log_mel = np.maximum(log_mel, log_mel.max() - 80.0)
+    out[MFCC] = (log_mel @ dct_matrix(N_MELS, N_MFCC)).mean(axis=0)
+
+    # Tempo (BPM) from the spectral flux onset envelope
+    onset_env = np.maximum(0.0, np.diff(log_mel, axis=0)).mean(axis=-1)
+    out[TEMPO] = estimate_tempo(onset_env, sr / HOP_LENGTH)
+
+    # Energy
+    out[ENERGY] = float(np.dot(y, y)) / max(y.size, 1)
+
+
+def extract_features_batch(clips: list, sr: int) -> np.ndarray:
+    """
+    Extract features for several clips at once, shape (B, N_FEATURES)
+    Clips are zero-padded into one (B, N) array so the FFT is a single batched
+    rfft and the mel projection a single matrix multiply; padded frames are
+    dropped again before each clip's features are aggregated
+    """
+    clips = [np.ascontiguousarray(y, dtype=np.float32) for y in clips]
+    batch = np.zeros((len(clips), max(y.size for y in clips)), dtype=np.float32)
+    for row, y in zip(batch, clips):
+        row[:y.size] = y
+
+    power = power_spectrogram(batch)
+    n_batch, n_frames, n_bins = power.shape
+    mel = (power.reshape(-1, n_bins) @ mel_filterbank(sr, N_FFT, N_MELS)).reshape(n_batch, n_frames, N_MELS)
+
+    features = np.zeros((n_batch, N_FEATURES), dtype=np.float32)
+    for i, y in enumerate(clips):
+        frames = num_frames(y.size)
+        _features_from_spectrum(y, power[i, :frames], mel[i, :frames], sr, features[i])
+    return features
+
+
+def extract_features(y: np.ndarray, sr: int) -> np.ndarray:
+    """Extract relevant audio features for emotion classification, shape (N_FEATURES,)"""
+    return extract_features_batch([y], sr)[0]
@@ -1,16 +1,96 @@
+import re
+from functools import lru_cache
 import numpy as np
 import librosa
+from numba import njit
+from audio_features import (
+    SAMPLE_RATE, ZCR, SPECTRAL_CENTROID, ENERGY, TEMPO,
+    extract_features, extract_features_batch
+)
 from sklearn.preprocessing import StandardScaler
 import os
+import tempfile
+
+EMOTIONS = ('happy', 'sad', 'energetic', 'calm', 'stressed', 'neutral')
+HAPPY, SAD, ENERGETIC, CALM, STRESSED, NEUTRAL = range(len(EMOTIONS))
+
+# Keyword fallback for free-text emotions; group names are the emotion labels
+_EMOTION_KEYWORDS = re.compile(
+    r'(?P<happy>happy|joy)|(?P<sad>sad|depress)|(?P<energetic>energetic|excite)'
+    r'|(?P<calm>calm|peace)|(?P<stressed>stress|anxious)',
+    re.IGNORECASE
+)
+
+@lru_cache(maxsize=2048)
+def _classify_text(text):
+    """Map free text to an emotion by keyword; repeated tags hit the cache"""
+    match = _EMOTION_KEYWORDS.search(text)
+    return match.lastgroup if match else 'neutral'
+
+@njit(cache=True)
+def _classify_code(zcr, energy, tempo, spectral_centroid):
+    """Rule-based classification kernel; returns an index into EMOTIONS"""
+    # High energy + high tempo = energetic
+    if energy > 0.1 and tempo > 140:
+        return ENERGETIC
+    
+    # Low energy + low tempo = calm or sad
+    if energy < 0.05 and tempo < 80:
+        if spectral_centroid < 1500:
+            return SAD
+        else:
+            return CALM
+    
+    # High ZCR + high energy = happy (2205 crossings/s = 0.1 per sample at 22.05 kHz)
+    if zcr > 2205 and energy > 0.08:
+        return HAPPY
+    
+    # Low spectral centroid = stressed or sad
+    if spectral_centroid < 1000:
+        return STRESSED
+    
+    # Default
+    return NEUTRAL
+
+# Feature columns read by the rules, in _classify_code argument order
+_RULE_COLUMNS = [ZCR, ENERGY, TEMPO, SPECTRAL_CENTROID]
+
+@njit(cache=True)
+def _classify_codes(rule_features):
+    """
+    Apply the rule kernel to every row of a (B, 4) array of zcr, energy, tempo and
+    spectral centroid; columns are selected in Python (see _RULE_COLUMNS) so the
+    cached kernel never depends on the layout constants in audio_features
+    """
+    codes = np.empty(rule_features.shape[0], dtype=np.int64)
+    for i in range(rule_features.shape[0]):
+        codes[i] = _classify_code(
+            rule_features[i, 0], rule_features[i, 1], rule_features[i, 2], rule_features[i, 3]
+        )
+    return codes
 
 class EmotionClassifier:
     """Classify emotions from voice and facial expressions"""
     
     def __init__(self):
         self.scaler = StandardScaler()
-        self.emotions = ['happy', 'sad', 'energetic', 'calm', 'stressed', 'neutral']
+        self.emotions = list(EMOTIONS)
         # In production, load a trained model here
         # self.model = load_model('emotion_model.h5')
+        
+        self.warmup()
+    
+    def warmup(self):
+        """
+        Run the voice pipeline once on silence so the Numba kernel and cached
+        filterbanks are built before the first request (and before forking)
+        """
+        try:
+            silence = np.zeros(SAMPLE_RATE, dtype=np.float32)
+            self.classify_from_features(self.extract_audio_features(silence, SAMPLE_RATE))
+            self.analyze_voice_batch([silence])
+        except Exception as e:
+            print(f"Error warming up voice analysis: {e}")
     
     def classify(self, input_data):
         """
@@ -20,21 +100,33 @@ class EmotionClassifier:
         # Simplified classification - in production use trained model
         if isinstance(input_data, str):
             # Simple keyword-based fallback
-            input_lower = input_data.lower()
-            if 'happy' in input_lower or 'joy' in input_lower:
-                return 'happy'
-            elif 'sad' in input_lower or 'depress' in input_lower:
-                return 'sad'
-            elif 'energetic' in input_lower or 'excite' in input_lower:
-                return 'energetic'
-            elif 'calm' in input_lower or 'peace' in input_lower:
-                return 'calm'
-            elif 'stress' in input_lower or 'anxious' in input_lower:
-                return 'stressed'
+            return _classify_text(input_data)
         
         # Default to neutral
         return 'neutral'
     
+    def load_audio(self, audio_path):
+        """Load up to 5 seconds of mono audio at the analysis sample rate"""
+        y, _ = librosa.load(audio_path, sr=SAMPLE_RATE, duration=5.0, mono=True, dtype=np.float32)
+        return y
+    
+    def load_voice_bytes(self, data):
+        """
+        Decode an uploaded audio payload, or return None if it can't be decoded
+        Written to a per-call temporary file so librosa can fall back to audioread
+        """
+        with tempfile.NamedTemporaryFile(suffix='.wav', delete=False) as temp_file:
+            temp_file.write(data)
+            temp_path = temp_file.name
+        
+        try:
+            return self.load_audio(temp_path)
+        except Exception as e:
+            print(f"Error decoding voice: {e}")
+            return None
+        finally:
+            os.remove(temp_path)
+    
     def analyze_voice(self, audio_path):
         """
         Analyze voice emotion from audio file
@@ -42,10 +134,10 @@ class EmotionClassifier:
         """
         try:
             # Load audio file
-            y, sr = librosa.load(audio_path, duration=5.0)
+            y = self.load_audio(audio_path)
             
             # Extract audio features
-            features = self.extract_audio_features(y, sr)
+            features = self.extract_audio_features(y, SAMPLE_RATE)
             
             # Classify emotion based on features
             emotion = self.classify_from_features(features)
@@ -55,32 +147,37 @@ class EmotionClassifier:
             print(f"Error analyzing voice: {e}")
             return 'neutral'
     
-    def extract_audio_features(self, y, sr):
-        """Extract relevant audio features for emotion classification"""
-        features = {}
-        
-        # Zero crossing rate (indicates energy)
-        features['zcr'] = np.mean(librosa.feature.zero_crossing_rate(y)[0])
-        
-        # Spectral centroid (brightness)
-        features['spectral_centroid'] = np.mean(librosa.feature.spectral_centroid(y=y, sr=sr)[0])
-        
-        # Spectral rolloff
-        features['spectral_rolloff'] = np.mean(librosa.feature.spectral_rolloff(y=y, sr=sr)[0])
-        
-        # MFCC features (mel-frequency cepstral coefficients)
-        mfccs = librosa.feature.mfcc(y=y, sr=sr, n_mfcc=13)
-        for i in range(13):
-            features[f'mfcc_{i}'] = np.mean(mfccs[i])
-        
-        # Tempo (BPM)
-        tempo, _ = librosa.beat.beat_track(y=y, sr=sr)
-        features['tempo'] = tempo
+    def analyze_voice_batch(self, clips):
+        """
+        Classify several decoded clips together
+        Features share one batched spectrogram pass across all clips
+        """
+        try:
+            features = extract_features_batch(clips, SAMPLE_RATE)
+            return [EMOTIONS[code] for code in _classify_codes(features[:, _RULE_COLUMNS])]
+        except Exception as e:
+            print(f"Error analyzing voice batch: {e}")
+            return ['neutral'] * len(clips)
+    
+    def analyze_voice_payloads(self, payloads):
+        """
+        Decode several uploaded audio payloads and classify them as one batch
+        Payloads that can't be decoded, or decode to an empty clip, are 'neutral'
+        """
+        emotions = ['neutral'] * len(payloads)
+        clips = [self.load_voice_bytes(data) for data in payloads]
+        decoded = [i for i, clip in enumerate(clips) if clip is not None and clip.size > 0]
         
-        # Energy
-        features['energy'] = np.sum(y**2) / len(y)
+        if decoded:
+            batch_emotions = self.analyze_voice_batch([clips[i] for i in decoded])
+            for i, emotion in zip(decoded, batch_emotions):
+                emotions[i] = emotion
         
-        return features
+        return emotions
+    
+    def extract_audio_features(self, y, sr):
+        """Extract relevant audio features for emotion classification"""
+        return extract_features(y, sr)
     
     def classify_from_features(self, features):
         """
@@ -90,30 +187,5 @@ class EmotionClassifier:
         # Simplified rule-based classification
         # In production, use a trained ML model (SVM, Random Forest, or Neural Network)
         
-        zcr = features.get('zcr', 0)
-        energy = features.get('energy', 0)
-        tempo = features.get('tempo', 120)
-        spectral_centroid = features.get('spectral_centroid', 2000)
-        
-        # High energy + high tempo = energetic
-        if energy > 0.1 and tempo > 140:
-            return 'energetic'
-        
-        # Low energy + low tempo = calm or sad
-        if energy < 0.05 and tempo < 80:
-            if spectral_centroid < 1500:
-                return 'sad'
-            else:
-                return 'calm'
-        
-        # High ZCR + high energy = happy
-        if zcr > 0.1 and energy > 0.08:
-            return 'happy'
-        
-        # Low spectral centroid = stressed or sad
-        if spectral_centroid < 1000:
-            return 'stressed'
-        
-        # Default
-        return 'neutral'
-
+        code = _classify_code(features[ZCR], features[ENERGY], features[TEMPO], features[SPECTRAL_CENTROID])
+        return EMOTIONS[code]
@@ -0,0 +1,21 @@
+"""
+Gunicorn configuration for the production backend server
+Usage: gunicorn -c gunicorn.conf.py app:app
+"""
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', 5000)}"
+
+# Quart is an ASGI app, so each worker runs its own uvicorn event loop
+worker_class = 'uvicorn.workers.UvicornWorker'
+workers = int(os.environ.get('WEB_CONCURRENCY', 2 * (os.cpu_count() or 1) + 1))
+
+# Export the worker count so app.py can split the CPU budget for voice analysis
+# across workers, and keep each DSP process to one BLAS thread
+os.environ['WEB_CONCURRENCY'] = str(workers)
+for var in ('OMP_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'MKL_NUM_THREADS'):
+    os.environ.setdefault(var, '1')
+
+# Load the app (and its classifiers) once before forking workers
+preload_app = True
+timeout = 60
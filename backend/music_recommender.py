@@ -1,65 +1,159 @@
 import os
-import requests
-from typing import List, Dict
+import time
+import asyncio
+import httpx
+from typing import List, Dict, Tuple
+
+# Emotion to music mapping; seed_genres must come from Spotify's available genre seeds
+EMOTION_MAPPING: Dict[str, Dict] = {
+    'happy': {
+        'genres': ['pop', 'dance', 'indie-pop', 'happy'],
+        'seed_genres': ['pop', 'dance', 'happy'],
+        'mood': 'upbeat',
+        'energy': 'high',
+        'valence': 'positive'
+    },
+    'sad': {
+        'genres': ['indie', 'acoustic', 'sad', 'ballad'],
+        'seed_genres': ['sad', 'acoustic', 'indie'],
+        'mood': 'melancholic',
+        'energy': 'low',
+        'valence': 'negative'
+    },
+    'energetic': {
+        'genres': ['rock', 'electronic', 'hip-hop', 'workout'],
+        'seed_genres': ['rock', 'electronic', 'hip-hop'],
+        'mood': 'energetic',
+        'energy': 'very-high',
+        'valence': 'positive'
+    },
+    'calm': {
+        'genres': ['ambient', 'classical', 'meditation', 'chill'],
+        'seed_genres': ['ambient', 'classical', 'chill'],
+        'mood': 'peaceful',
+        'energy': 'low',
+        'valence': 'neutral'
+    },
+    'stressed': {
+        'genres': ['ambient', 'nature-sounds', 'meditation', 'zen'],
+        'seed_genres': ['ambient', 'sleep', 'new-age'],
+        'mood': 'relaxing',
+        'energy': 'very-low',
+        'valence': 'neutral'
+    },
+    'neutral': {
+        'genres': ['indie', 'pop', 'chill', 'easy-listening'],
+        'seed_genres': ['indie', 'pop', 'chill'],
+        'mood': 'neutral',
+        'energy': 'medium',
+        'valence': 'neutral'
+    }
+}
+
+# Static playlists used when Spotify is unavailable
+_FALLBACK: Dict[str, Tuple[Dict[str, str], ...]] = {
+    'happy': (
+        {'name': 'Happy Hits 2024', 'artist': 'Various Artists', 'url': '#', 'type': 'playlist'},
+        {'name': 'Upbeat Pop Mix', 'artist': 'Various Artists', 'url': '#', 'type': 'playlist'},
+        {'name': 'Feel Good Music', 'artist': 'Various Artists', 'url': '#', 'type': 'playlist'},
+        {'name': 'Dance Party', 'artist': 'Various Artists', 'url': '#', 'type': 'playlist'},
+        {'name': 'Sunny Day Vibes', 'artist': 'Various Artists', 'url': '#', 'type': 'playlist'}
+    ),
+    'sad': (
+        {'name': 'Melancholic Melodies', 'artist': 'Various Artists', 'url': '#', 'type': 'playlist'},
+        {'name': 'Emotional Ballads', 'artist': 'Various Artists', 'url': '#', 'type': 'playlist'},
+        {'name': 'Reflective Tunes', 'artist': 'Various Artists', 'url': '#', 'type': 'playlist'},
+        {'name': 'Rainy Day Music', 'artist': 'Various Artists', 'url': '#', 'type': 'playlist'},
+        {'name': 'Heartbreak Songs', 'artist': 'Various Artists', 'url': '#', 'type': 'playlist'}
+    ),
+    'energetic': (
+        {'name': 'High Energy Workout', 'artist': 'Various Artists', 'url': '#', 'type': 'playlist'},
+        {'name': 'Power Anthems', 'artist': 'Various Artists', 'url': '#', 'type': 'playlist'},
+        {'name': 'Energetic Beats', 'artist': 'Various Artists', 'url': '#', 'type': 'playlist'},
+        {'name': 'Pump Up Music', 'artist': 'Various Artists', 'url': '#', 'type': 'playlist'},
+        {'name': 'Workout Motivation', 'artist': 'Various Artists', 'url': '#', 'type': 'playlist'}
+    ),
+    'calm': (
+        {'name': 'Peaceful Sounds', 'artist': 'Various Artists', 'url': '#', 'type': 'playlist'},
+        {'name': 'Meditation Music', 'artist': 'Various Artists', 'url': '#', 'type': 'playlist'},
+        {'name': 'Relaxing Vibes', 'artist': 'Various Artists', 'url': '#', 'type': 'playlist'},
+        {'name': 'Calm Instrumentals', 'artist': 'Various Artists', 'url': '#', 'type': 'playlist'},
+        {'name': 'Zen Garden', 'artist': 'Various Artists', 'url': '#', 'type': 'playlist'}
+    ),
+    'stressed': (
+        {'name': 'Stress Relief', 'artist': 'Various Artists', 'url': '#', 'type': 'playlist'},
+        {'name': 'Calming Nature Sounds', 'artist': 'Various Artists', 'url': '#', 'type': 'playlist'},
+        {'name': 'Zen Music', 'artist': 'Various Artists', 'url': '#', 'type': 'playlist'},
+        {'name': 'Anxiety Relief', 'artist': 'Various Artists', 'url': '#', 'type': 'playlist'},
+        {'name': 'Peaceful Meditation', 'artist': 'Various Artists', 'url': '#', 'type': 'playlist'}
+    ),
+    'neutral': (
+        {'name': 'Chill Vibes', 'artist': 'Various Artists', 'url': '#', 'type': 'playlist'},
+        {'name': 'Background Music', 'artist': 'Various Artists', 'url': '#', 'type': 'playlist'},
+        {'name': 'Easy Listening', 'artist': 'Various Artists', 'url': '#', 'type': 'playlist'},
+        {'name': 'Indie Mix', 'artist': 'Various Artists', 'url': '#', 'type': 'playlist'},
+        {'name': 'Casual Listening', 'artist': 'Various Artists', 'url': '#', 'type': 'playlist'}
+    )
+}
 
 class MusicRecommender:
     """Recommend music based on detected emotions"""
     
+    # Spotify audio-feature targets for the mapping's energy/valence labels
+    _ENERGY_MAP = {'very-low': 0.1, 'low': 0.2, 'medium': 0.5, 'high': 0.8, 'very-high': 0.95}
+    _VALENCE_MAP = {'negative': 0.2, 'neutral': 0.5, 'positive': 0.8}
+    
     def __init__(self):
         self.spotify_client_id = os.getenv('SPOTIFY_CLIENT_ID', '')
         self.spotify_client_secret = os.getenv('SPOTIFY_CLIENT_SECRET', '')
         self.spotify_token = None
+        self.token_expiry = 0
+        # Created lazily so it binds to the serving event loop
+        self._token_lock = None
+        # Cleared once Spotify refuses the recommendations endpoint for this app
+        self.recommendations_available = True
+        # One pooled HTTP/2 client for all Spotify calls; the timeout applies to every request
+        self._client = httpx.AsyncClient(
+            http2=True,
+            timeout=5,
+            headers={'Accept': 'application/json'}
+        )
         
-        # Emotion to music mapping
-        self.emotion_mapping = {
-            'happy': {
-                'genres': ['pop', 'dance', 'indie-pop', 'happy'],
-                'mood': 'upbeat',
-                'energy': 'high',
-                'valence': 'positive'
-            },
-            'sad': {
-                'genres': ['indie', 'acoustic', 'sad', 'ballad'],
-                'mood': 'melancholic',
-                'energy': 'low',
-                'valence': 'negative'
-            },
-            'energetic': {
-                'genres': ['rock', 'electronic', 'hip-hop', 'workout'],
-                'mood': 'energetic',
-                'energy': 'very-high',
-                'valence': 'positive'
-            },
-            'calm': {
-                'genres': ['ambient', 'classical', 'meditation', 'chill'],
-                'mood': 'peaceful',
-                'energy': 'low',
-                'valence': 'neutral'
-            },
-            'stressed': {
-                'genres': ['ambient', 'nature-sounds', 'meditation', 'zen'],
-                'mood': 'relaxing',
-                'energy': 'very-low',
-                'valence': 'neutral'
-            },
-            'neutral': {
-                'genres': ['indie', 'pop', 'chill', 'easy-listening'],
-                'mood': 'neutral',
-                'energy': 'medium',
-                'valence': 'neutral'
-            }
-        }
+        # Spotify results cache: key -> (expires_at, results)
+        self.cache_ttl = int(os.getenv('SPOTIFY_CACHE_TTL', 3600))
+        self._cache = {}
+        
+        self.emotion_mapping = EMOTION_MAPPING
+    
+    def _cache_get(self, key):
+        """Return cached results for key, or None if missing or expired"""
+        entry = self._cache.get(key)
+        if entry is None:
+            return None
+        expires_at, results = entry
+        if time.monotonic() >= expires_at:
+            del self._cache[key]
+            return None
+        return list(results)
+    
+    def _cache_set(self, key, results):
+        """Store results for key until the cache TTL elapses"""
+        self._cache[key] = (time.monotonic() + self.cache_ttl, list(results))
     
-    def get_spotify_token(self):
+    async def aclose(self):
+        """Close the shared HTTP client"""
+        await self._client.aclose()
+    
+    async def get_spotify_token(self):
         """Get Spotify API access token"""
         if not self.spotify_client_id or not self.spotify_client_secret:
             return None
         
         try:
             auth_url = 'https://accounts.spotify.com/api/token'
-            auth_response = requests.post(
+            auth_response = await self._client.post(
                 auth_url,
-                {
+                data={
                     'grant_type': 'client_credentials',
                     'client_id': self.spotify_client_id,
                     'client_secret': self.spotify_client_secret,
@@ -68,19 +162,41 @@ class MusicRecommender:
             )
             
             if auth_response.status_code == 200:
-                self.spotify_token = auth_response.json()['access_token']
+                token_data = auth_response.json()
+                self.spotify_token = token_data['access_token']
+                # Refresh a minute early so in-flight calls never use an expired token
+                self.token_expiry = time.monotonic() + token_data.get('expires_in', 3600) - 60
                 return self.spotify_token
         except Exception as e:
             print(f"Error getting Spotify token: {e}")
         
         return None
     
-    def search_spotify(self, query: str, limit: int = 10):
+    async def _ensure_token(self) -> bool:
+        """Fetch a new Spotify token if there is none or it has expired"""
+        if self._token_valid():
+            return True
+        
+        if self._token_lock is None:
+            self._token_lock = asyncio.Lock()
+        
+        # Concurrent searches share one refresh instead of each POSTing for a token
+        async with self._token_lock:
+            if not self._token_valid():
+                await self.get_spotify_token()
+        
+        return self._token_valid()
+    
+    def _token_valid(self) -> bool:
+        return self.spotify_token is not None and time.monotonic() < self.token_expiry
+    
+    async def search_spotify(self, query: str, limit: int = 10):
         """Search Spotify for tracks/playlists"""
-        if not self.spotify_token:
-            self.get_spotify_token()
+        cached = self._cache_get(('search', query, limit))
+        if cached is not None:
+            return cached
         
-        if not self.spotify_token:
+        if not await self._ensure_token():
             return []
         
         try:
@@ -92,7 +208,7 @@ class MusicRecommender:
                 'limit': limit
             }
             
-            response = requests.get(search_url, headers=headers, params=params)
+            response = await self._client.get(search_url, headers=headers, params=params)
             
             if response.status_code == 200:
                 data = response.json()
@@ -121,29 +237,84 @@ class MusicRecommender:
                             'image': item['album'].get('images', [{}])[0].get('url', '')
                         })
                 
-                return results[:limit]
+                results = results[:limit]
+                self._cache_set(('search', query, limit), results)
+                return results
         except Exception as e:
             print(f"Error searching Spotify: {e}")
         
         return []
     
-    def get_recommendations(self, emotion: str) -> List[Dict]:
+    async def recommend_spotify(self, mapping: Dict, limit: int = 10) -> List[Dict]:
+        """Get pre-ranked tracks from Spotify's recommendations endpoint"""
+        if not self.recommendations_available or not await self._ensure_token():
+            return []
+        
+        try:
+            recommendations_url = 'https://api.spotify.com/v1/recommendations'
+            headers = {'Authorization': f'Bearer {self.spotify_token}'}
+            params = {
+                'seed_genres': ','.join(mapping['seed_genres']),
+                'target_energy': self._ENERGY_MAP[mapping['energy']],
+                'target_valence': self._VALENCE_MAP[mapping['valence']],
+                'limit': limit
+            }
+            
+            response = await self._client.get(recommendations_url, headers=headers, params=params)
+            
+            if response.status_code == 200:
+                results = []
+                for item in response.json().get('tracks', []):
+                    artist_name = ', '.join([a['name'] for a in item['artists']])
+                    results.append({
+                        'name': item['name'],
+                        'artist': artist_name,
+                        'url': item['external_urls']['spotify'],
+                        'type': 'track',
+                        'image': item['album'].get('images', [{}])[0].get('url', '')
+                    })
+                
+                return results
+            
+            # The app has no access to the endpoint; stop paying for the failed call
+            if response.status_code in (403, 404):
+                print(f"Spotify recommendations unavailable ({response.status_code}), using search instead")
+                self.recommendations_available = False
+        except Exception as e:
+            print(f"Error getting Spotify recommendations: {e}")
+        
+        return []
+    
+    async def get_recommendations(self, emotion: str) -> List[Dict]:
         """Get music recommendations for a given emotion"""
         emotion = emotion.lower()
         
         if emotion not in self.emotion_mapping:
             emotion = 'neutral'
         
+        cached = self._cache_get(('recommendations', emotion))
+        if cached is not None:
+            return cached
+        
         mapping = self.emotion_mapping[emotion]
         recommendations = []
         
         # Try to get recommendations from Spotify
         if self.spotify_client_id and self.spotify_client_secret:
-            for genre in mapping['genres'][:2]:  # Try first 2 genres
-                spotify_results = self.search_spotify(f"genre:{genre} {mapping['mood']}", limit=5)
-                recommendations.extend(spotify_results)
-                if len(recommendations) >= 10:
-                    break
+            recommendations = await self.recommend_spotify(mapping, limit=10)
+            
+            # Fall back to searching the first 2 genres concurrently
+            if not recommendations:
+                searches = [
+                    self.search_spotify(f"genre:{genre} {mapping['mood']}", limit=5)
+                    for genre in mapping['genres'][:2]
+                ]
+                for spotify_results in await asyncio.gather(*searches):
+                    recommendations.extend(spotify_results)
+            
+            # Only cache real Spotify results so an outage isn't pinned for the TTL
+            if recommendations:
+                self._cache_set(('recommendations', emotion), recommendations[:10])
         
         # If no Spotify results, use fallback recommendations
         if not recommendations:
@@ -153,50 +324,5 @@ class MusicRecommender:
     
     def get_fallback_recommendations(self, emotion: str) -> List[Dict]:
         """Fallback recommendations when API is not available"""
-        fallback = {
-            'happy': [
-                {'name': 'Happy Hits 2024', 'artist': 'Various Artists', 'url': '#', 'type': 'playlist'},
-                {'name': 'Upbeat Pop Mix', 'artist': 'Various Artists', 'url': '#', 'type': 'playlist'},
-                {'name': 'Feel Good Music', 'artist': 'Various Artists', 'url': '#', 'type': 'playlist'},
-                {'name': 'Dance Party', 'artist': 'Various Artists', 'url': '#', 'type': 'playlist'},
-                {'name': 'Sunny Day Vibes', 'artist': 'Various Artists', 'url': '#', 'type': 'playlist'}
-            ],
-            'sad': [
-                {'name': 'Melancholic Melodies', 'artist': 'Various Artists', 'url': '#', 'type': 'playlist'},
-                {'name': 'Emotional Ballads', 'artist': 'Various Artists', 'url': '#', 'type': 'playlist'},
-                {'name': 'Reflective Tunes', 'artist': 'Various Artists', 'url': '#', 'type': 'playlist'},
-                {'name': 'Rainy Day Music', 'artist': 'Various Artists', 'url': '#', 'type': 'playlist'},
-                {'name': 'Heartbreak Songs', 'artist': 'Various Artists', 'url': '#', 'type': 'playlist'}
-            ],
-            'energetic': [
-                {'name': 'High Energy Workout', 'artist': 'Various Artists', 'url': '#', 'type': 'playlist'},
-                {'name': 'Power Anthems', 'artist': 'Various Artists', 'url': '#', 'type': 'playlist'},
-                {'name': 'Energetic Beats', 'artist': 'Various Artists', 'url': '#', 'type': 'playlist'},
-                {'name': 'Pump Up Music', 'artist': 'Various Artists', 'url': '#', 'type': 'playlist'},
-                {'name': 'Workout Motivation', 'artist': 'Various Artists', 'url': '#', 'type': 'playlist'}
-            ],
-            'calm': [
-                {'name': 'Peaceful Sounds', 'artist': 'Various Artists', 'url': '#', 'type': 'playlist'},
-                {'name': 'Meditation Music', 'artist': 'Various Artists', 'url': '#', 'type': 'playlist'},
-                {'name': 'Relaxing Vibes', 'artist': 'Various Artists', 'url': '#', 'type': 'playlist'},
-                {'name': 'Calm Instrumentals', 'artist': 'Various Artists', 'url': '#', 'type': 'playlist'},
-                {'name': 'Zen Garden', 'artist': 'Various Artists', 'url': '#', 'type': 'playlist'}
-            ],
-            'stressed': [
-                {'name': 'Stress Relief', 'artist': 'Various Artists', 'url': '#', 'type': 'playlist'},
-                {'name': 'Calming Nature Sounds', 'artist': 'Various Artists', 'url': '#', 'type': 'playlist'},
-                {'name': 'Zen Music', 'artist': 'Various Artists', 'url': '#', 'type': 'playlist'},
-                {'name': 'Anxiety Relief', 'artist': 'Various Artists', 'url': '#', 'type': 'playlist'},
-                {'name': 'Peaceful Meditation', 'artist': 'Various Artists', 'url': '#', 'type': 'playlist'}
-            ],
-            'neutral': [
-                {'name': 'Chill Vibes', 'artist': 'Various Artists', 'url': '#', 'type': 'playlist'},
-                {'name': 'Background Music', 'artist': 'Various Artists', 'url': '#', 'type': 'playlist'},
-                {'name': 'Easy Listening', 'artist': 'Various Artists', 'url': '#', 'type': 'playlist'},
-                {'name': 'Indie Mix', 'artist': 'Various Artists', 'url': '#', 'type': 'playlist'},
-                {'name': 'Casual Listening', 'artist': 'Various Artists', 'url': '#', 'type': 'playlist'}
-            ]
-        }
-        
-        return fallback.get(emotion, fallback['neutral'])
+        return list(_FALLBACK.get(emotion, _FALLBACK['neutral']))
 
@@ -1,6 +1,6 @@
 #!/usr/bin/env python
 """
-Run script for the Flask backend server
+Run script for the Quart backend server
 """
 from app import app
 import os
@@ -11,5 +11,6 @@ load_dotenv()
 
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 5000))
-    app.run(host='0.0.0.0', port=port, debug=True)
+    debug = os.environ.get('QUART_ENV') == 'development'
+    app.run(host='0.0.0.0', port=port, debug=debug)
 
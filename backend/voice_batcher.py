@@ -0,0 +1,63 @@
+import asyncio
+
+class VoiceBatcher:
+    """
+    Coalesce concurrent voice uploads into micro-batches
+    While earlier batches are still in flight, uploads submitted within max_wait
+    seconds of each other (up to max_batch) are analyzed by a single call to
+    analyze_batch; an upload arriving while idle is dispatched immediately
+    """
+    
+    def __init__(self, analyze_batch, max_batch=8, max_wait=0.02):
+        # analyze_batch: async callable taking a list of uploads, returning one emotion per upload
+        self.analyze_batch = analyze_batch
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self._queue = None
+        self._collector = None
+        self._dispatches = set()
+    
+    def start(self):
+        """Start collecting batches on the running event loop"""
+        self._queue = asyncio.Queue()
+        self._collector = asyncio.create_task(self._collect())
+    
+    async def stop(self):
+        """Stop collecting and wait for in-flight batches to finish"""
+        self._collector.cancel()
+        await asyncio.gather(self._collector, *self._dispatches, return_exceptions=True)
+    
+    async def submit(self, payload):
+        """Queue one upload and wait for its emotion"""
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((payload, future))
+        return await future
+    
+    async def _collect(self):
+        while True:
+            batch = [await self._queue.get()]
+            
+            # Under load, give concurrent uploads a short window to join this batch;
+            # when idle there is nothing to coalesce with, so don't add latency
+            if self._dispatches or not self._queue.empty():
+                await asyncio.sleep(self.max_wait)
+            while len(batch) < self.max_batch and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            
+            # Dispatch without waiting so the next batch can start collecting
+            task = asyncio.create_task(self._dispatch(batch))
+            self._dispatches.add(task)
+            task.add_done_callback(self._dispatches.discard)
+    
+    async def _dispatch(self, batch):
+        try:
+            emotions = await self.analyze_batch([payload for payload, _ in batch])
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        
+        for (_, future), emotion in zip(batch, emotions):
+            if not future.done():
+                future.set_result(emotion)